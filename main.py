@@ -15,6 +15,8 @@ ZEP '휴식 봇' — FastAPI + Playwright (최종본)
 실행 전 준비(.env)
   ZEP_PLAY_URL=https://zep.us/play/XXXXXX
   BOT_NAME=휴식 조교      (선택)
+  HEADLESS=1             (선택, 0이면 브라우저 창 표시)
+  BLOCK_RESOURCES=1      (선택, 0이면 이미지/미디어/폰트 차단 해제)
 
 실행
   uvicorn main:app --reload --port 8000
@@ -24,14 +26,17 @@ API
   POST /command {"text": "#10"}  ← 서버가 파싱해서 타이머 시작
 """
 
-import asyncio, os, re, time, random
+import asyncio, heapq, os, re, time, random
+from collections import OrderedDict
 from dataclasses import dataclass
+from hashlib import blake2b
 from typing import Optional
 
 from dotenv import load_dotenv
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
-from playwright.async_api import async_playwright, Page
+from playwright.async_api import async_playwright, Page, ElementHandle
 
 # ────────────────────────────────────────────────────────────────────────────
 # 환경 변수/상수
@@ -41,6 +46,10 @@ ZEP_URL = os.getenv("ZEP_PLAY_URL")
 BOT_NAME = os.getenv("BOT_NAME", "휴식 조교")
 if not ZEP_URL:
     raise RuntimeError("ZEP_PLAY_URL(.env)이 비어 있습니다.")
+HEADLESS = os.getenv("HEADLESS", "1") == "1"                 # 서버 운영은 headless
+BLOCK_RESOURCES = os.getenv("BLOCK_RESOURCES", "1") == "1"   # 텍스트만 읽으므로 무거운 리소스 차단
+# ※ Playwright는 page.route를 하나라도 걸면 HTTP 캐시를 끔 → 재접속 시 스크립트 등도 캐시 없이 다시 받음
+#   차단 이득(이미지/미디어/폰트)이 더 크다고 보고 기본 on, 네트워크가 아깝다면 BLOCK_RESOURCES=0
 
 DEBUG = True  # 문제 있을 때만 True로
 
@@ -52,22 +61,134 @@ RECENT_NAME_SEC      = 30     # 최근 닉네임 캐시 유지시간
 GLOBAL_MINUTE_GUARD  = 10     # 전역 분수 가드: 같은 '분' 10초 내 1회만
 MIN_SEND_INTERVAL    = 1.8    # 연속 전송 최소 간격(초)
 MAX_RETRY            = 10     # 전송 재시도 최대 횟수
+BACKOFF_BASE         = 0.8    # 재시도 대기 하한(초)
+BACKOFF_CAP          = 6.0    # 재시도 대기 상한(초)
 ENABLE_SCAN_LOOP     = True   # 채팅 스캔 on/off
+WATCH_FALLBACK_SEC   = 10     # 새 말풍선이 없을 때 감시자 재확인/수동 수집 주기(초)
+# 차단 대상 URL(이미지/미디어/폰트 확장자) — 이 패턴만 라우팅해서 스크립트/XHR/wasm은 파이썬을 거치지 않음
+#   CSS는 입력창/토스트 표시 판정에 필요해서 유지
+BLOCKED_RESOURCE_RE  = re.compile(
+    r'\.(?:png|jpe?g|gif|webp|avif|bmp|ico|svg'
+    r'|woff2?|ttf|otf|eot'
+    r'|mp3|mp4|m4a|ogg|oga|wav|webm)(?:[?#].*)?$',
+    re.I
+)
+GUARD_CACHE_SIZE     = 512    # 가드 캐시별 최대 키 수(LRU)
+SWEEP_EVERY_TICKS    = 30     # 스캔 루프 N틱마다 만료 키 정리
 
 # ────────────────────────────────────────────────────────────────────────────
 # 셀렉터/정규식/템플릿
 # ────────────────────────────────────────────────────────────────────────────
 CHAT_INPUT_SEL     = 'input[placeholder="채팅을 입력해 주세요"], textarea[placeholder="채팅을 입력해 주세요"]'
 BUBBLE_SEL         = 'div[data-sentry-element="NewBubbleContainer"]'
+NEW_BUBBLE_SEL     = BUBBLE_SEL + ':not([data-bot-seen="1"])'   # 아직 처리 안 한 말풍선만
 NICKNAME_INPUT_SEL = 'input[type="text"]'
 ENTER_BUTTON_SEL   = 'button:has-text("Enter"), button:has-text("입장"), button:has-text("Start"), button:has-text("시작")'
-COOLDOWN_TOAST     = 'div:has-text("잠시 후에 채팅을 입력할 수 있습니다")'
+
+# 쿨다운 토스트 표시 여부를 한 번의 evaluate로 판정(query_selector + is_visible 2회 왕복 대체)
+#   ':has-text'는 Playwright 전용 → 같은 방식(요소 전체 텍스트, 공백 정규화, 대소문자 무시)으로 비교
+#   ① body 전체에 문구가 없으면 즉시 false ② 토스트/알림 컨테이너 우선 ③ 없으면 문구를 담은 가장 안쪽 div
+#   채팅 말풍선 안의 같은 문구는 토스트가 아니므로 제외
+COOLDOWN_TOAST_TEXT = "잠시 후에 채팅을 입력할 수 있습니다"
+TOAST_CANDIDATE_SEL = '[role="alert"], [role="status"], [class*="toast" i], [class*="snackbar" i]'
+TOAST_VISIBLE_JS = """([text, candSel, bubbleSel]) => {
+    const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim().toLowerCase();
+    const needle = norm(text);
+    if (!norm(document.body.textContent).includes(needle)) return false;
+    const shown = (el) => el.getClientRects().length > 0 && getComputedStyle(el).visibility !== 'hidden';
+    const hit = (el) => !el.closest(bubbleSel) && norm(el.textContent).includes(needle);
+    for (const el of document.querySelectorAll(candSel)) {
+        if (hit(el) && shown(el)) return true;
+    }
+    for (const el of document.querySelectorAll('div')) {
+        if (!hit(el)) continue;
+        if ([...el.children].some(c => c.tagName === 'DIV' && hit(c))) continue;   // 더 안쪽 div가 있으면 그쪽에서 판정
+        if (shown(el)) return true;
+    }
+    return false;
+}"""
+
+# 아직 처리 안 한 말풍선을 한 번의 evaluate로 수집 + 즉시 'seen' 마킹
+#   → 버블마다 get_attribute/inner_text/evaluate 왕복하던 것을 틱당 1회로
+#   반환: [{text, sender}] — text는 닉네임 줄을 뗀 본문, sender는 닉네임(없으면 null)
+#   닉네임은 ① 버블 첫 줄 → ② 실패 시에만 버블 주변 DOM 탐색(DOM 구조 변경 대비, 레이아웃 비용 큼)
+EXTRACT_NEW_BUBBLES_JS = """(sel) => {
+    const looksLikeName = (t) =>
+        !!t && t.length <= 32 && !t.startsWith('#') && !t.includes('분') && !t.includes('휴식');
+    const findSender = (el) => {
+        let h = el;
+        for (let i = 0; i < 4 && h; i++) {
+            let prev = h.previousElementSibling;
+            if (!(prev && prev.innerText && prev.innerText.trim())) {
+                const parent = h.parentElement;
+                if (!parent) return null;
+                const pp = parent.previousElementSibling;
+                prev = (pp && pp.innerText && pp.innerText.trim()) ? pp : parent;
+            }
+            const txt = (prev.innerText || '').trim();
+            if (looksLikeName(txt)) return txt;
+            h = prev;
+        }
+        return null;
+    };
+    const out = [];
+    for (const el of document.querySelectorAll(sel)) {
+        const text = (el.innerText || '').trim();
+        if (!text) continue;   // 본문이 아직 렌더 전이면 'seen' 찍지 않고 다음 변경 때 다시 수집
+        el.setAttribute('data-bot-seen', '1');
+        // 닉네임/본문 분리 (한 줄짜리 말풍선이 대부분 → 줄바꿈 없으면 split 생략)
+        let msg = text, sender = null;
+        if (text.includes('\\n')) {
+            const parts = text.split('\\n').map(p => p.trim()).filter(Boolean);
+            if (parts.length >= 2 && looksLikeName(parts[0])) {
+                sender = parts[0];
+                msg = parts.slice(1).join('\\n');
+            }
+        }
+        if (!sender) sender = findSender(el);
+        out.push({ text: msg, sender });
+    }
+    return out;
+}"""
+
+# 현재 DOM의 말풍선 전부를 한 번에 'seen' 마킹하고 개수 반환(프리로드용)
+MARK_ALL_SEEN_JS = """(sel) => {
+    const els = document.querySelectorAll(sel);
+    els.forEach(e => e.setAttribute('data-bot-seen', '1'));
+    return els.length;
+}"""
+
+# 말풍선이 DOM에 추가될 때마다 위 추출 함수를 돌려 window.onNewBubble(item)로 push
+#   (expose_binding으로 연결된 파이썬 큐) → 1초 폴링 없이 이벤트 기반으로 처리
+#   같은 마이크로태스크 안의 변경은 한 번의 추출로 묶음. 텍스트 변경(characterData)도 감시
+#   문서당 1회만 설치(재호출 시엔 즉시 수집만) → 재설치/폴백 수집 모두 이 함수 하나로
+INSTALL_BUBBLE_OBSERVER_JS = """(sel) => {
+    if (!window.__botFlushBubbles) {
+        const extract = """ + EXTRACT_NEW_BUBBLES_JS + """;
+        let pending = false;
+        const flush = () => {
+            pending = false;
+            for (const item of extract(sel)) window.onNewBubble(item);
+        };
+        window.__botFlushBubbles = flush;
+        new MutationObserver(() => {
+            if (pending) return;
+            pending = true;
+            queueMicrotask(flush);
+        }).observe(document.body, { childList: true, subtree: true, characterData: true });
+    }
+    window.__botFlushBubbles();
+}"""
 
 # 명령/자연어 패턴
-CMD_RE       = re.compile(r'^#?\s*휴식\s*(\d+)\s*(?:분)?\s*$', re.I)                # "휴식 10", "#휴식 10", "휴식 10분"
-SHORT_RE     = re.compile(r'^\s*#\s*(\d{1,3})\s*$', re.I)                          # "#10"
-NATURAL_RE   = re.compile(r'^\s*(\d{1,3})\s*분\s*.*?(휴식|쉬)[가-힣\s\w]*$', re.I)    # "10분 휴식하겠습니다"
-BACK_RE      = re.compile(r'복귀(했|함|요|완료)?', re.I)
+#   세 가지 명령 형태를 하나의 alternation으로 묶어 한 번의 match로 분류(앞쪽 대안 우선)
+#   → 매칭된 대안의 이름(lastgroup)이 곧 '분' 숫자 그룹
+CMD_MASTER_RE = re.compile(
+    r'^#?\s*휴식\s*(?P<cmd>\d+)\s*(?:분)?\s*$'                         # "휴식 10", "#휴식 10", "휴식 10분"
+    r'|^\s*#\s*(?P<short>\d{1,3})\s*$'                                  # "#10"
+    r'|^\s*(?P<natural>\d{1,3})\s*분\s*.*?(?:휴식|쉬)[가-힣\s\w]*$',     # "10분 휴식하겠습니다"
+    re.I
+)
 
 # 안내/예시 문구, 시작/종료 멘트 등의 '잡음'을 무시
 START_NOISE_RE = re.compile(
@@ -79,56 +200,75 @@ START_NOISE_RE = re.compile(
     re.I
 )
 
-START_TPL = [
+START_TPL = (
     "#휴식 {m}분 시작 - by {who}",
     "⏱️ {m}분 쉬어요!! - {who}",
     "휴식 {m}분 가즈아~ 🙌 - {who}",
-]
-END_TPL = [
+)
+END_TPL = (
     "⏰휴식 종료 - {who}",
     "⏰끝! 다시 고! — {who}",
     "⏰휴식 {m}분 끝났어요. 파이팅 💪{who}✏️",
-]
-BACK_TPL = ["넵", "넵!!", "복귀 확인! 👋", "이제 공부 ㄱㄱ 🚀"]
+)
+BACK_TPL = ("넵", "넵!!", "복귀 확인! 👋", "이제 공부 ㄱㄱ 🚀")
+_START_N, _END_N, _BACK_N = len(START_TPL), len(END_TPL), len(BACK_TPL)
+
+def _compile_tpl(tpl: str):
+    """{m}/{who} 두 자리표시자만 쓰는 템플릿 → (m, who) 호출형 (str.format 파싱 생략)"""
+    return lambda m, who: tpl.replace("{m}", str(m)).replace("{who}", who)
+
+START_FNS = tuple(_compile_tpl(t) for t in START_TPL)
+END_FNS   = tuple(_compile_tpl(t) for t in END_TPL)
 
 def pick(seq):
     return random.choice(seq)
 
+def next_backoff(prev: float) -> float:
+    """decorrelated jitter: U(BASE, 직전*3), 상한 CAP — 첫 재시도부터 박자가 흩어짐"""
+    return min(BACKOFF_CAP, random.uniform(BACKOFF_BASE, prev * 3))
+
 @dataclass
 class Seen:
     key: str
     ts: float
 
-# ────────────────────────────────────────────────────────────────────────────
-# (유틸) 버블 주변에서 닉네임 추정 — DOM 구조 변경 대비
-# ────────────────────────────────────────────────────────────────────────────
-async def find_sender_near_bubble(page: Page, bubble_element):
-    try:
-        h = bubble_element
-        for _ in range(4):
-            prev = await h.evaluate_handle(
-                """(e) => {
-                    if (!e) return null;
-                    let p = e.previousElementSibling;
-                    if (p && p.innerText && p.innerText.trim()) return p;
-                    const parent = e.parentElement;
-                    if (!parent) return null;
-                    let pp = parent.previousElementSibling;
-                    if (pp && pp.innerText && pp.innerText.trim()) return pp;
-                    return parent;
-                }"""
-            )
-            if prev is None: break
-            try:
-                txt = (await prev.inner_text()).strip()
-            except:
-                txt = ""
-            if txt and len(txt) <= 32 and not txt.startswith("#") and "분" not in txt and "휴식" not in txt:
-                return txt
-            h = prev
-    except:
-        pass
-    return None
+def _fp(s: str) -> bytes:
+    """중복가드 키용 8바이트 지문 — 긴 메시지 원문 대신 캐시에 저장"""
+    return blake2b(s.encode("utf-8"), digest_size=8).digest()
+
+class TTLCache:
+    """TTL + 크기 상한(LRU) 캐시. 키는 최근 mark 순으로 정렬되어 있어 앞에서부터 만료 정리"""
+    def __init__(self, ttl: float, max_size: int = GUARD_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._d: OrderedDict = OrderedDict()
+
+    def seen(self, key) -> bool:
+        ts = self._d.get(key)
+        if ts is None:
+            return False
+        if time.monotonic() - ts < self.ttl:
+            return True
+        del self._d[key]
+        return False
+
+    def mark(self, key):
+        self._d[key] = time.monotonic()
+        self._d.move_to_end(key)
+        if len(self._d) > self.max_size:
+            self._d.popitem(last=False)
+
+    def sweep(self):
+        """가장 오래된 쪽부터 만료 키 제거 — 만료 안 된 키를 만나면 중단"""
+        limit = time.monotonic() - self.ttl
+        while self._d:
+            key, ts = next(iter(self._d.items()))
+            if ts > limit:
+                break
+            del self._d[key]
+
+    def __len__(self):
+        return len(self._d)
 
 # ────────────────────────────────────────────────────────────────────────────
 # (유틸) 명령 텍스트 → minutes 정규화
@@ -143,20 +283,10 @@ def normalize_cmd_text(t: str) -> Optional[int]:
     if s.isdigit():
         return None
 
-    m = CMD_RE.match(s)
+    # 모든 대안이 ^에 고정 → 잡담은 첫 글자에서 바로 실패하므로 별도 사전 검사 불필요
+    m = CMD_MASTER_RE.match(s)
     if m:
-        return int(m.group(1))
-
-    m = SHORT_RE.match(s)
-    if m:
-        return int(m.group(1))
-
-    m = NATURAL_RE.match(s)
-    if m:
-        return int(m.group(1))
-
-    if re.match(r'^#\s*\d+\s*분$', s):
-        return None
+        return int(m.group(m.lastgroup))
 
     return None
 
@@ -168,11 +298,11 @@ class BreakBot:
         self.page = page
 
         # 중복/가드 캐시
-        self.trigger_seen: dict[str, float] = {}   # (sender,msg) TTL
-        self.msg_seen: dict[str, float] = {}       # msg-only TTL
-        self.cmd_guard: dict[str, float] = {}      # 같은 사람+분수 가드
-        self.cmd_text_guard: dict[str, float] = {} # 같은 문장 가드
-        self.minute_global_guard: dict[int, float] = {}  # 전역 분수 가드
+        self.trigger_seen = TTLCache(SENDER_MSG_TTL)            # (sender,msg) TTL
+        self.msg_seen = TTLCache(MSG_ONLY_TTL)                  # msg-only TTL
+        self.cmd_guard = TTLCache(CMD_GUARD_TTL)                # 같은 사람+분수 가드
+        self.cmd_text_guard = TTLCache(10)                      # 같은 문장 가드
+        self.minute_global_guard = [float("-inf")] * 181        # 전역 분수 가드: 분(1..180) → 마지막 시각(monotonic)
 
         # 상태/락
         self._recent_sender: tuple[str, float] | None = None
@@ -180,15 +310,37 @@ class BreakBot:
         self._send_lock = asyncio.Lock()
         self._last_send_ts = 0.0
         self._cooldown_until = 0.0
+        self._chat_input: ElementHandle | None = None   # 채팅 입력창 핸들 캐시(전송 실패 시 재조회)
 
         # ★ ‘이전 기록 무시’용 커서: 마지막으로 처리한 말풍선의 Y좌표
         self.last_seen_y: float = 0.0
 
-        self.running_timers: set[asyncio.Task] = set()
+        # 휴식 종료 예약: (종료 시각[monotonic], 휴식 id, who, 종료 멘트) min-heap — timer_loop 하나가 처리
+        self._timer_heap: list[tuple[float, int, str, str]] = []
+        self._timer_wakeup = asyncio.Event()
+        self._timer_seq = 0
+        self._cancelled_breaks: set[int] = set()   # 복귀로 조기 종료된 휴식 id → 종료 멘트 생략
 
-        # 사용자별 진행 중인 휴식 상태 {who: {"task": asyncio.Task, "until": float, "minutes": int}}
+        # 사용자별 진행 중인 휴식 상태 {who: {"id": int, "until": float, "minutes": int}}
         self.active_breaks: dict[str, dict] = {}
 
+        # 브라우저(MutationObserver) → 파이썬으로 넘어오는 새 말풍선 {text, sender}
+        self._bubble_queue: asyncio.Queue = asyncio.Queue()
+
+    def _sweep_expired(self):
+        for cache in (self.trigger_seen, self.msg_seen, self.cmd_guard, self.cmd_text_guard):
+            cache.sweep()
+
+    async def _get_input(self) -> ElementHandle | None:
+        if self._chat_input is None:
+            self._chat_input = await self.page.query_selector(CHAT_INPUT_SEL)
+        return self._chat_input
+
+    async def _toast_visible(self) -> bool:
+        return await self.page.evaluate(
+            TOAST_VISIBLE_JS, [COOLDOWN_TOAST_TEXT, TOAST_CANDIDATE_SEL, BUBBLE_SEL]
+        )
+
     # ── 안전 전송(레이트리밋 백오프 + 직렬화 + 최소 간격) ──
     async def type_and_send(self, text: str):
         async with self._send_lock:
@@ -200,40 +352,42 @@ class BreakBot:
             if gap < MIN_SEND_INTERVAL:
                 await asyncio.sleep(MIN_SEND_INTERVAL - gap)
 
-            el = await self.page.query_selector(CHAT_INPUT_SEL)
-            if not el:
+            if not await self._get_input():
                 print("[WARN] 채팅 입력창을 찾을 수 없음:", CHAT_INPUT_SEL)
                 return
 
-            backoff = 0.8
+            # 직전 대기값 — 매 대기 직전에 next_backoff로 지터 적용(첫 재시도도 U(BASE, BASE*3))
+            backoff = BACKOFF_BASE
             for _ in range(MAX_RETRY):
                 # 쿨다운 토스트가 보이면 잠깐 대기
                 try:
-                    toast = await self.page.query_selector(COOLDOWN_TOAST)
-                    if toast and await toast.is_visible():
+                    if await self._toast_visible():
+                        backoff = next_backoff(backoff)
                         self._cooldown_until = time.time() + backoff
-                        await asyncio.sleep(backoff); backoff = min(backoff*1.6, 6.0)
+                        await asyncio.sleep(backoff)
                         continue
                 except:
                     pass
 
                 try:
-                    await el.scroll_into_view_if_needed()
-                    await el.click()
+                    el = await self._get_input()
+                    if el is None:
+                        raise RuntimeError("채팅 입력창을 찾을 수 없음")
                     try:
-                        await el.fill("")
-                    except:
-                        # 일부 환경에서 .fill 실패할 경우 value를 직접 비움
+                        # fill은 포커스 + 기존 값 교체 + input 이벤트 1회 (글자별 keydown 없음)
+                        await el.fill(text)
+                    except Exception:
+                        # 일부 환경에서 .fill 실패할 경우 value를 직접 비우고 타이핑
                         await self.page.evaluate("(e)=>{e.value='';}", el)
-                    await el.type(text)
+                        await el.type(text)
                     await el.press("Enter")
 
                     # 전송 직후에도 토스트가 뜰 수 있으므로 한 번 더 확인
                     await asyncio.sleep(0.12)
-                    toast = await self.page.query_selector(COOLDOWN_TOAST)
-                    if toast and await toast.is_visible():
+                    if await self._toast_visible():
+                        backoff = next_backoff(backoff)
                         self._cooldown_until = time.time() + backoff
-                        await asyncio.sleep(backoff); backoff = min(backoff*1.6, 6.0)
+                        await asyncio.sleep(backoff)
                         continue
 
                     self._last_send_ts = time.time()
@@ -241,8 +395,10 @@ class BreakBot:
                     return
                 except Exception as e:
                     if DEBUG: print("[SEND error]", e)
+                    self._chat_input = None   # 핸들이 분리(detached)됐을 수 있으니 다음 시도에서 재조회
+                    backoff = next_backoff(backoff)
                     self._cooldown_until = time.time() + backoff
-                    await asyncio.sleep(backoff); backoff = min(backoff*1.6, 6.0)
+                    await asyncio.sleep(backoff)
 
             print("[WARN] 전송 실패:", text)
 
@@ -268,45 +424,65 @@ class BreakBot:
                 return {"ok": False, "reason": "already-on-break"}
 
         # 전역 '분' 가드: 최근 GLOBAL_MINUTE_GUARD초 내 동일 분이면 무시
-        if now - self.minute_global_guard.get(minutes, 0.0) < GLOBAL_MINUTE_GUARD:
+        mono = time.monotonic()
+        if mono - self.minute_global_guard[minutes] < GLOBAL_MINUTE_GUARD:
             if DEBUG: print("[GLOBAL minute guard hit]", minutes)
             return {"ok": False, "reason": "minute-guard"}
-        self.minute_global_guard[minutes] = now
+        self.minute_global_guard[minutes] = mono
 
         # 같은 사람+분수 가드(보조)
         gk = f"{who}::{minutes}"
-        if now - self.cmd_guard.get(gk, 0.0) < CMD_GUARD_TTL:
+        if self.cmd_guard.seen(gk):
             if DEBUG: print("[USER minute guard hit]", gk)
             return {"ok": False, "reason": "user-minute-guard"}
-        self.cmd_guard[gk] = now
+        self.cmd_guard.mark(gk)
 
-        start_text = random.choice(START_TPL).format(m=minutes, who=who)
-        end_text   = random.choice(END_TPL).format(m=minutes, who=who)
+        start_text = START_FNS[random.randrange(_START_N)](minutes, who)
+        end_text   = END_FNS[random.randrange(_END_N)](minutes, who)
 
         await self.say(start_text)
 
-        # 종료 시각을 기록하고 사용자별 활성 휴식에 등록
+        # 종료 시각을 기록하고 사용자별 활성 휴식에 등록 + 종료 예약
+        #   until은 남은 시간 표시용(벽시계), 실제 예약은 시계 변경(NTP 등)에 안 흔들리는 monotonic
         until_ts = time.time() + (minutes * 60)
-        def _drop():
-            self.active_breaks.pop(who, None)
+        self._timer_seq += 1
+        fire_ts = time.monotonic() + (minutes * 60) + random.uniform(0, 0.7)  # 자연스러운 딜레이
+        heapq.heappush(self._timer_heap, (fire_ts, self._timer_seq, who, end_text))
+        self._timer_wakeup.set()
+        self.active_breaks[who] = {"id": self._timer_seq, "until": until_ts, "minutes": minutes}
+
+        return {"ok": True}
 
-        async def timer():
+    # ── 휴식 종료 디스패처: 가장 먼저 끝나는 예약 하나만 기다림 ──
+    async def timer_loop(self):
+        while True:
+            self._timer_wakeup.clear()
+            if not self._timer_heap:
+                await self._timer_wakeup.wait()
+                continue
+
+            delay = self._timer_heap[0][0] - time.monotonic()
+            if delay > 0:
+                # 더 이른 예약이 들어오면 wakeup으로 깨어나 다시 계산
+                try:
+                    await asyncio.wait_for(self._timer_wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, break_id, who, end_text = heapq.heappop(self._timer_heap)
+            if break_id in self._cancelled_breaks:
+                # 복귀로 조기 종료된 예약: 일반 종료 멘트는 내지 않음
+                self._cancelled_breaks.discard(break_id)
+                continue
+            # 그 사이 같은 사람이 새 휴식을 시작했을 수 있으니 자기 항목일 때만 제거
+            meta = self.active_breaks.get(who)
+            if meta and meta["id"] == break_id:
+                self.active_breaks.pop(who, None)
             try:
-                await asyncio.sleep(minutes * 60)
-                await asyncio.sleep(random.uniform(0, 0.7))  # 자연스러운 딜레이
                 await self.say(end_text)
-            except asyncio.CancelledError:
-                # 복귀로 인한 취소: 일반 종료 멘트는 내지 않음
-                pass
-            finally:
-                _drop()
-                self.running_timers.discard(asyncio.current_task())
-
-        t = asyncio.create_task(timer())
-        self.running_timers.add(t)
-        self.active_breaks[who] = {"task": t, "until": until_ts, "minutes": minutes}
-
-        return {"ok": True}
+            except Exception as e:
+                if DEBUG: print("[timer err]", e)
 
     # ── 말풍선 1개 처리 ──
     async def handle_chat_item(self, text: str, sender: Optional[str]):
@@ -319,35 +495,31 @@ class BreakBot:
         if t.isdigit(): return
 
         # 복귀 멘트(짧은 응답, 2초 쿨다운 또는 조기 종료)
-        if BACK_RE.search(t):
+        if "복귀" in t:
             now = time.time()
             who_back = sender or (self._recent_sender[0] if (self._recent_sender and now - self._recent_sender[1] <= RECENT_NAME_SEC) else None)
 
             # 같은 사람이 복귀하면 진행 중인 자신의 휴식을 취소(조기 종료)
             if who_back and who_back in self.active_breaks and now < self.active_breaks[who_back]["until"]:
-                task = self.active_breaks[who_back]["task"]
-                try:
-                    task.cancel()  # 타이머 즉시 취소
-                except:
-                    pass
-                # 상태 제거
-                self.active_breaks.pop(who_back, None)
+                # 상태 제거 + 취소 표시 → 힙에 남은 종료 예약은 timer_loop가 건너뜀
+                meta = self.active_breaks.pop(who_back)
+                self._cancelled_breaks.add(meta["id"])
                 # 복귀 확인과 즉시 종료 멘트를 연달아 전송
-                await self.say(random.choice(BACK_TPL))
+                await self.say(BACK_TPL[random.randrange(_BACK_N)])
                 await self.say(f"⏰휴식 종료 - {who_back}")
                 return
 
             # 진행 중 휴식이 없으면 일반 복귀 멘트(스팸 방지 2초 쿨다운)
             if now >= self._back_cooldown:
                 self._back_cooldown = now + 2
-                await self.say(random.choice(BACK_TPL))
+                await self.say(BACK_TPL[random.randrange(_BACK_N)])
             return
 
         # 같은 문장 10초 가드
-        text_key = re.sub(r'\s+', ' ', t.lower())
-        if time.time() - self.cmd_text_guard.get(text_key, 0.0) < 10:
+        text_key = " ".join(t.lower().split())
+        if self.cmd_text_guard.seen(text_key):
             return
-        self.cmd_text_guard[text_key] = time.time()
+        self.cmd_text_guard.mark(text_key)
 
         # 명령 정규화 → minutes
         minutes = normalize_cmd_text(t)
@@ -366,66 +538,71 @@ class BreakBot:
 
         await self.start_break(minutes, who=who)
 
+    async def watch_bubbles(self):
+        """새 말풍선 감시자 설치 — 이후 말풍선은 _bubble_queue로 들어옴"""
+        await self.page.expose_binding(
+            "onNewBubble", lambda source, item: self._bubble_queue.put_nowait(item)
+        )
+        await self.page.evaluate(INSTALL_BUBBLE_OBSERVER_JS, NEW_BUBBLE_SEL)
+        # 새로고침/재접속으로 문서가 바뀌면 감시자가 사라지므로 load마다 재설치
+        self.page.on("load", self._rewatch_bubbles)
+
+    async def _rewatch_bubbles(self, _page=None):
+        try:
+            # 새 문서의 기존 말풍선(과거 대화)은 프리로드처럼 무시
+            await self.page.evaluate(MARK_ALL_SEEN_JS, BUBBLE_SEL)
+            await self.page.evaluate(INSTALL_BUBBLE_OBSERVER_JS, NEW_BUBBLE_SEL)
+        except Exception as e:
+            if DEBUG: print("[watch reinstall err]", e)
+
     async def scan_loop(self):
+        tick = 0
         while True:
             try:
-                bubbles = await self.page.query_selector_all(BUBBLE_SEL)
+                item = await asyncio.wait_for(self._bubble_queue.get(), timeout=WATCH_FALLBACK_SEC)
+            except asyncio.TimeoutError:
+                # 조용할 때 폴백: 감시자가 없으면 재설치하고, 놓친 말풍선은 바로 수집
+                #   (새 문서가 load 전이면 건너뜀 — 과거 대화 무시는 load 핸들러 몫)
+                try:
+                    if await self.page.evaluate("() => document.readyState") == "complete":
+                        await self.page.evaluate(INSTALL_BUBBLE_OBSERVER_JS, NEW_BUBBLE_SEL)
+                except Exception as e:
+                    if DEBUG: print("[scan loop err]", e)
+                continue
 
-                # 정리: 종료된 타이머의 active_breaks 항목 제거
-                for name, meta in list(self.active_breaks.items()):
-                    t = meta.get("task")
-                    if t and t.done():
-                        self.active_breaks.pop(name, None)
+            tick += 1
+            if tick % SWEEP_EVERY_TICKS == 0:
+                self._sweep_expired()
 
-                for b in bubbles:
-                    try:
-                        # 이미 처리한 버블이면 스킵
-                        seen = await b.get_attribute("data-bot-seen")
-                        if seen == "1":
-                            continue
-
-                        content = (await b.inner_text()).strip()
-                        # 바로 'seen' 찍어서 중복 방지 (내용이 비어도 처리 완료로 간주)
-                        await b.evaluate("(el)=>el.setAttribute('data-bot-seen','1')")
-                        if not content:
-                            continue
-
-                        # 닉네임/본문 분리
-                        parts = [p.strip() for p in content.split("\n") if p.strip()]
-                        sender, msg_text = None, content
-                        if len(parts) >= 2 and (len(parts[0]) <= 32 and not parts[0].startswith("#")
-                                                and "분" not in parts[0] and "휴식" not in parts[0]):
-                            sender, msg_text = parts[0], "\n".join(parts[1:])
-                        if not sender:
-                            sender = await find_sender_near_bubble(self.page, b)
-
-                        # 최근 화자 캐시
-                        now = time.time()
-                        if sender:
-                            self._recent_sender = (sender, now)
-
-                        # TTL 가드
-                        k  = f"{(sender or 'unknown').strip()}::{msg_text.strip()}"
-                        k2 = msg_text.strip().lower()
-                        if now - self.trigger_seen.get(k, 0.0) < SENDER_MSG_TTL:   continue
-                        if now - self.msg_seen.get(k2, 0.0)   < MSG_ONLY_TTL:     continue
-                        self.trigger_seen[k] = now
-                        self.msg_seen[k2]    = now
-
-                        if DEBUG: print("[MSG]", sender or "(None)", "|", msg_text)
-                        await self.handle_chat_item(msg_text, sender)
-
-                    except Exception as e:
-                        if DEBUG: print("[scan item err]", e)
+            try:
+                # 닉네임/본문 분리는 추출 스크립트에서 끝남
+                msg_text, sender = item["text"], item["sender"]
 
-            except Exception as e:
-                if DEBUG: print("[scan loop err]", e)
+                # 최근 화자 캐시
+                now = time.time()
+                if sender:
+                    self._recent_sender = (sender, now)
+
+                # TTL 가드
+                k  = _fp(f"{(sender or 'unknown').strip()}::{msg_text.strip()}")
+                k2 = _fp(msg_text.strip().lower())
+                if self.trigger_seen.seen(k): continue
+                if self.msg_seen.seen(k2):    continue
+                self.trigger_seen.mark(k)
+                self.msg_seen.mark(k2)
+
+                if DEBUG: print("[MSG]", sender or "(None)", "|", msg_text)
+                await self.handle_chat_item(msg_text, sender)
 
-            await asyncio.sleep(1.0)
+            except Exception as e:
+                if DEBUG: print("[scan item err]", e)
 
 # ────────────────────────────────────────────────────────────────────────────
 # ZEP 방 입장(게스트)
 # ────────────────────────────────────────────────────────────────────────────
+async def block_heavy_resources(route):
+    await route.abort()
+
 async def enter_as_guest(page: Page):
     await page.goto(ZEP_URL, wait_until="domcontentloaded")
     try:
@@ -447,20 +624,13 @@ async def enter_as_guest(page: Page):
 # ────────────────────────────────────────────────────────────────────────────
 async def preload_mark_seen(bot: BreakBot):
     """현재 화면에 이미 떠있는 말풍선은 data-bot-seen=1로 마킹해서 완전 무시"""
-    bubbles = await bot.page.query_selector_all(BUBBLE_SEL)
-    cnt = 0
-    for b in bubbles:
-        try:
-            await b.evaluate("(el)=>el.setAttribute('data-bot-seen','1')")
-            cnt += 1
-        except:
-            pass
+    cnt = await bot.page.evaluate(MARK_ALL_SEEN_JS, BUBBLE_SEL)
     print(f"[INIT] 기존 버블 {cnt}개를 'seen' 처리했습니다.")
 
 # ────────────────────────────────────────────────────────────────────────────
 # FastAPI 앱/수명주기
 # ────────────────────────────────────────────────────────────────────────────
-app = FastAPI(title="ZEP Break Bot API")
+app = FastAPI(title="ZEP Break Bot API", default_response_class=ORJSONResponse)
 
 class SayReq(BaseModel):
     text: str = Field(..., min_length=1)
@@ -477,16 +647,22 @@ _playwright = None
 _browser = None
 _page: Optional[Page] = None
 _scan_task: Optional[asyncio.Task] = None
+_timer_task: Optional[asyncio.Task] = None
 
 @app.on_event("startup")
 async def on_startup():
-    global _playwright, _browser, _page, bot, _scan_task
+    global _playwright, _browser, _page, bot, _scan_task, _timer_task
     _playwright = await async_playwright().start()
-    _browser = await _playwright.chromium.launch(headless=False)
+    _browser = await _playwright.chromium.launch(
+        headless=HEADLESS, args=["--disable-gpu", "--disable-dev-shm-usage"]
+    )
     _page = await _browser.new_page()
+    if BLOCK_RESOURCES:
+        await _page.route(BLOCKED_RESOURCE_RE, block_heavy_resources)
     await enter_as_guest(_page)
 
     bot = BreakBot(_page)
+    _timer_task = asyncio.create_task(bot.timer_loop())
 
     # 기존: await preload_cursor(bot)
     await preload_mark_seen(bot)
@@ -499,13 +675,15 @@ async def on_startup():
                   "예) OO분 휴식하겠습니다 ← 이런 식으로 보내주시면 타이머가 시작돼요.")
 
     if ENABLE_SCAN_LOOP:
+        await bot.watch_bubbles()
         _scan_task = asyncio.create_task(bot.scan_loop())
 
 @app.on_event("shutdown")
 async def on_shutdown():
-    global _playwright, _browser, _page, _scan_task
+    global _playwright, _browser, _page, _scan_task, _timer_task
     try:
         if _scan_task: _scan_task.cancel()
+        if _timer_task: _timer_task.cancel()
         if _browser: await _browser.close()
         if _playwright: await _playwright.stop()
     except: